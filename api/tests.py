@@ -1,3 +1,164 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import requests
+from django.test import RequestFactory, SimpleTestCase
+
+from api import views
+from api.views import (
+    COMMON_ADDITIVES,
+    COMMON_ALLERGENS,
+    FoodProductView,
+    FoodProductViewBatch,
+    USDA_BATCH_LIMIT,
+    compile_keyword_pattern,
+)
+
+
+def usda_response(data):
+    """Fake requests.Response carrying a USDA JSON body."""
+    response = mock.Mock()
+    response.content = orjson.dumps(data)
+    response.raise_for_status.return_value = None
+    return response
+
+
+def usda_food(fdc_id, ingredients=None):
+    """Minimal USDA food detail record."""
+    return {'fdcId': int(fdc_id), 'description': f'Food {fdc_id}', 'ingredients': ingredients}
+
+
+class FoodProductViewBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        redis_patcher = mock.patch.object(views, 'redis_client')
+        self.redis = redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+        self.redis.mget.side_effect = lambda keys: [None] * len(keys)
+
+        usda_patcher = mock.patch.object(views.usda_session, 'get')
+        self.usda_get = usda_patcher.start()
+        self.addCleanup(usda_patcher.stop)
+        self.usda_get.side_effect = lambda url, params=None, **kwargs: usda_response(
+            [usda_food(fdc_id) for fdc_id in params['fdcIds']]
+        )
+
+    def get(self, fc_ids):
+        request = self.factory.get('/analyze-food-batch/', {'fcIDs': fc_ids})
+        return FoodProductViewBatch.as_view()(request)
+
+    def requested_ids(self):
+        return self.usda_get.call_args.kwargs['params']['fdcIds']
+
+    def test_missing_ids(self):
+        for fc_ids in ('', ' , ,'):
+            response = self.get(fc_ids)
+            self.assertEqual(response.status_code, 400)
+        self.usda_get.assert_not_called()
+
+    def test_rejects_non_numeric_ids(self):
+        for fc_ids in ('1,abc', '1,-2', '²', '1' * 13):
+            response = self.get(fc_ids)
+            self.assertEqual(response.status_code, 400, fc_ids)
+        self.usda_get.assert_not_called()
+
+    def test_dedupes_ids_in_request_order(self):
+        response = self.get(' 8, 7,008 ,7')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.requested_ids(), ['8', '7'])
+        ids = [food['basic_info']['id'] for food in orjson.loads(response.content)['data']]
+        self.assertEqual(ids, [8, 7])
+
+    def test_id_limit(self):
+        response = self.get(','.join(str(i) for i in range(1, USDA_BATCH_LIMIT + 2)))
+        self.assertEqual(response.status_code, 400)
+        self.usda_get.assert_not_called()
+
+        # Duplicates don't count towards the limit
+        response = self.get(','.join(str(i) for i in range(1, USDA_BATCH_LIMIT + 1)) + ',1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requested_ids()), USDA_BATCH_LIMIT)
+
+    def test_unknown_ids_are_null(self):
+        self.usda_get.side_effect = lambda url, params=None, **kwargs: usda_response([usda_food(2)])
+
+        response = self.get('1,2,3')
+
+        data = orjson.loads(response.content)['data']
+        self.assertEqual(data[0], None)
+        self.assertEqual(data[1]['basic_info']['id'], 2)
+        self.assertEqual(data[2], None)
+
+    def test_cached_ids_skip_usda(self):
+        cached = orjson.dumps(FoodProductView.process_food_data(usda_food(1)))
+        self.redis.mget.side_effect = lambda keys: [cached if key == 'food_product:1' else None for key in keys]
+
+        response = self.get('1,2')
+
+        self.assertEqual(self.requested_ids(), ['2'])
+        data = orjson.loads(response.content)['data']
+        self.assertEqual([food['basic_info']['id'] for food in data], [1, 2])
+        self.redis.pipeline.return_value.setex.assert_called_once_with(
+            'food_product:2', views.CACHE_TTL, orjson.dumps(data[1])
+        )
+
+    def test_all_cached_skips_usda(self):
+        cached = orjson.dumps(FoodProductView.process_food_data(usda_food(1)))
+        self.redis.mget.side_effect = lambda keys: [cached] * len(keys)
+
+        response = self.get('1')
+
+        self.assertEqual(response.status_code, 200)
+        self.usda_get.assert_not_called()
+
+    def test_usda_failure(self):
+        self.usda_get.side_effect = requests.ConnectionError()
+        self.assertEqual(self.get('1').status_code, 502)
+
+        self.usda_get.side_effect = lambda url, params=None, **kwargs: mock.Mock(
+            content=b'<html>Down for maintenance</html>', **{'raise_for_status.return_value': None}
+        )
+        self.assertEqual(self.get('1').status_code, 502)
+
+
+class KeywordPatternTests(SimpleTestCase):
+    def test_rejects_prefix_keywords(self):
+        with self.assertRaises(ValueError):
+            compile_keyword_pattern(('nut', 'nutmeg'))
+
+        with self.assertRaises(ValueError):
+            compile_keyword_pattern(('Nitr', 'nitrate'))
+
+    def test_reports_overlapping_keywords(self):
+        pattern = compile_keyword_pattern(('fish', 'shellfish', 'soy'))
+        self.assertEqual(set(pattern.findall('Shellfish, SOYBEAN oil')), {'Shellfish', 'fish', 'SOY'})
+
+
+class IngredientAnalysisTests(SimpleTestCase):
+    def analyze(self, ingredients):
+        return FoodProductView.process_food_data(usda_food(1, ingredients))['analysis']
+
+    def test_reported_in_list_order(self):
+        analysis = self.analyze(
+            'Sesame oil, WHEAT flour, shellfish, soybeans, milk, sodium benzoate, Aspartame, MSG'
+        )
+
+        self.assertEqual(analysis['allergens'], ['milk', 'soy', 'wheat', 'fish', 'shellfish', 'sesame'])
+        self.assertEqual(analysis['additives'], ['aspartame', 'msg', 'benzoate'])
+        self.assertIn('Contains allergens: milk, soy, wheat, fish, shellfish, sesame', analysis['key_highlights'])
+        self.assertIn('Contains artificial additives', analysis['key_highlights'])
+
+    def test_matches_substring_scan(self):
+        ingredients = 'Water, high fructose corn syrup, peanuts, eggs, artificial flavor, red dye 40, BHT'
+        lowered = ingredients.lower()
+        analysis = self.analyze(ingredients)
+
+        self.assertEqual(analysis['allergens'], [allergen for allergen in COMMON_ALLERGENS if allergen in lowered])
+        self.assertEqual(analysis['additives'], [additive for additive in COMMON_ADDITIVES if additive in lowered])
+
+    def test_no_ingredients(self):
+        analysis = self.analyze(None)
+        self.assertEqual(analysis['allergens'], [])
+        self.assertEqual(analysis['additives'], [])
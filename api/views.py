@@ -1,17 +1,35 @@
-import json
+import functools
+import hashlib
+import io
+import logging
+import math
+import mimetypes
+import operator
+import orjson
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 import os
+import re
 from django.shortcuts import render
+from django.views import View
 from gradio_client import Client, handle_file
 import spacy
 import tempfile
+import threading
+import time
+from PIL import Image, ImageOps
 import redis
 from google import genai
-from django.http import JsonResponse
+from google.genai import types
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+
+logger = logging.getLogger(__name__)
 
 # Get the directory of the current script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,14 +39,240 @@ load_dotenv(os.path.join(BASE_DIR, '.env'))
 
 # Initialize Redis connection
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-redis_client = redis.from_url(redis_url)
+# One bounded pool per worker, shared by every view; callers wait briefly for a free connection
+redis_pool = redis.BlockingConnectionPool.from_url(
+    redis_url,
+    max_connections=int(os.getenv('REDIS_POOL_SIZE', 32)),
+    timeout=2
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
 CACHE_TTL = 60 * 60 * 24  # Cache for 24 hours
+CLIENT_CACHE_MAX_AGE = 60 * 60  # How long clients may reuse a USDA lookup response
 
-nlp = spacy.load("en_core_web_sm")
+# Only the tagger, attribute_ruler (POS) and parser (deps, noun_chunks) are used by extract_product_name
+nlp = spacy.load("en_core_web_sm", disable=["ner", "lemmatizer"])
 
 Max_Requests = int(os.getenv('MAX_REQUESTS', 30))
 Max_LLM_Requests = int(os.getenv('MAX_LLM_REQUESTS', 10))
 
+# Longest side (px) uploaded images are downscaled to before recognition
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', 1024))
+
+# Where uploads are spooled for gradio_client, which needs a real path; prefer RAM-backed tmpfs
+UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+USDA_API_KEY = os.getenv('USDA_API_KEY')
+
+# Shared HTTP session so USDA calls reuse pooled keep-alive connections
+usda_session = requests.Session()
+usda_session.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    # Retry refused connections and gateway errors, but never a read timeout: a hung USDA call
+    # would otherwise tie the worker up for every attempt's full read timeout. Gateway errors
+    # get one retry, each can take a full read, and a maintenance Retry-After is not slept on.
+    max_retries=Retry(
+        total=3,
+        read=False,
+        status=1,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        respect_retry_after_header=False
+    )
+))
+usda_session.headers.update({'accept': 'application/json'})
+usda_session.params = {'api_key': USDA_API_KEY}
+FDC_ID_PATTERN = re.compile(r'[0-9]{1,12}')  # fdcIds are plain ASCII digits; the bound keeps int() well clear of its digit limit
+USDA_BATCH_LIMIT = 20  # Max fdcIds USDA accepts per /foods request
+USDA_TIMEOUT = (3.05, 10)  # (connect, read) seconds, connect just above the 3s TCP retransmit window
+USDA_FETCH_LOCK_TTL = 15  # Seconds one worker may hold a product refresh before others fetch it too
+USDA_FETCH_WAIT = 2  # Seconds a worker waits for another worker's refresh of the same product
+
+# Group nutrients by category
+NUTRIENT_CATEGORIES = {
+    'macronutrients': ('Protein', 'Total lipid (fat)', 'Carbohydrate, by difference'),
+    'vitamins': ('Vitamin A', 'Vitamin C', 'Vitamin D', 'Vitamin E', 'Vitamin K',
+                 'Thiamin', 'Riboflavin', 'Niacin', 'Vitamin B-6', 'Folate', 'Vitamin B-12'),
+    'minerals': ('Calcium', 'Iron', 'Magnesium', 'Phosphorus', 'Potassium', 'Sodium', 'Zinc',
+                 'Copper', 'Selenium'),
+    'other': ('Fiber, total dietary', 'Total Sugars', 'Cholesterol',
+              'Fatty acids, total saturated', 'Fatty acids, total trans')
+}
+
+# Specific nutrients tracked for health metrics
+NUTRIENT_VALUE_KEYS = (
+    'calories', 'fat', 'sodium', 'fiber', 'protein', 'carbs',
+    'sugars', 'cholesterol', 'saturated_fat', 'trans_fat',
+)
+
+# labelNutrients keys mapped to the nutrient_values slot they fill
+LABEL_NUTRIENT_KEYS = (
+    ('calories', 'calories'),
+    ('fat', 'fat'),
+    ('sodium', 'sodium'),
+    ('protein', 'protein'),
+    ('carbohydrates', 'carbs'),
+)
+
+# Health metric flags: (metric, nutrient, comparison, threshold)
+HEALTH_METRIC_RULES = (
+    ('is_low_fat', 'fat', operator.le, 3),
+    ('is_low_sodium', 'sodium', operator.le, 140),
+    ('is_high_fiber', 'fiber', operator.ge, 5),
+    ('is_low_calorie', 'calories', operator.le, 40),
+    ('is_high_protein', 'protein', operator.ge, 5),
+)
+
+# Key highlights in display order: (nutrient, comparison, threshold, highlight)
+# The sodium and fat pairs have disjoint ranges, so at most one of each applies
+HIGHLIGHT_RULES = (
+    ('calories', operator.eq, 0, "Zero calories"),
+    ('sodium', operator.gt, 400, "High sodium content"),
+    ('sodium', operator.lt, 140, "Low sodium"),
+    ('fiber', operator.ge, 5, "Good source of fiber"),
+    ('protein', operator.ge, 5, "Good source of protein"),
+    ('fat', operator.le, 3, "Low fat"),
+    ('fat', operator.ge, 15, "High fat content"),
+)
+
+# Common allergens to check for in ingredients
+COMMON_ALLERGENS = (
+    "milk", "dairy", "egg", "peanut", "tree nut", "soy", "wheat",
+    "gluten", "fish", "shellfish", "sesame"
+)
+
+# Common additives to check for in ingredients
+COMMON_ADDITIVES = (
+    "aspartame", "sucralose", "saccharin", "high fructose", "msg",
+    "monosodium glutamate", "artificial", "preservative", "benzoate",
+    "nitrite", "nitrate", "bht", "bha", "red dye", "yellow dye", "blue dye"
+)
+
+
+def compile_keyword_pattern(keywords):
+    """
+    Compile keywords into a single alternation that finds every keyword in one scan.
+    The alternation sits inside a lookahead so overlapping hits are all reported
+    (e.g. both 'shellfish' and 'fish'), matching plain substring checks. Only the
+    longest keyword is reported at a given position, so no keyword may be a prefix
+    of another; this is checked here and raises ValueError. Matching is
+    case-insensitive, so callers lowercase the hits rather than the whole text.
+    """
+    keywords = sorted({k.lower() for k in keywords}, key=lambda k: (-len(k), k))
+    for i, longer in enumerate(keywords):
+        for shorter in keywords[i + 1:]:
+            if longer.startswith(shorter):
+                raise ValueError(f"Keyword {shorter!r} is a prefix of {longer!r} and would be shadowed by it")
+
+    alternation = '|'.join(re.escape(k) for k in keywords)
+    return re.compile(f'(?=({alternation}))', re.IGNORECASE)
+
+
+# Allergens and additives are found together in one pass over the ingredients
+INGREDIENT_PATTERN = compile_keyword_pattern(COMMON_ALLERGENS + COMMON_ADDITIVES)
+
+
+def get_nutrient_category(nutrient_name):
+    """
+    Map a USDA nutrient name to its category in NUTRIENT_CATEGORIES.
+    USDA names carry suffixes (e.g. 'Calcium, Ca'), so this matches by substring.
+
+    Args:
+        nutrient_name (str): Nutrient name from the USDA payload
+
+    Returns:
+        str: Category name, 'other' if no category matches
+    """
+    for category, nutrient_list in NUTRIENT_CATEGORIES.items():
+        if any(n in nutrient_name for n in nutrient_list):
+            return category
+    return 'other'
+
+
+def get_nutrient_slot(nutrient_name):
+    """
+    Map a USDA nutrient name to the nutrient_values slot it fills.
+
+    Args:
+        nutrient_name (str): Nutrient name from the USDA payload
+
+    Returns:
+        str | None: Key in NUTRIENT_VALUE_KEYS, or None if the nutrient isn't tracked
+    """
+    if nutrient_name == 'Energy':
+        return 'calories'
+    if 'Total lipid (fat)' in nutrient_name:
+        return 'fat'
+    if 'Sodium' in nutrient_name:
+        return 'sodium'
+    if 'Fiber, total dietary' in nutrient_name:
+        return 'fiber'
+    if nutrient_name == 'Protein':
+        return 'protein'
+    if 'Carbohydrate' in nutrient_name:
+        return 'carbs'
+    if 'Total Sugars' in nutrient_name:
+        return 'sugars'
+    if 'Cholesterol' in nutrient_name:
+        return 'cholesterol'
+    nutrient_name_lower = nutrient_name.lower()
+    if 'saturated' in nutrient_name_lower:
+        return 'saturated_fat'
+    if 'trans' in nutrient_name_lower:
+        return 'trans_fat'
+    return None
+
+
+@functools.lru_cache(maxsize=1024)
+def classify_nutrient(nutrient_name):
+    """
+    Resolve a USDA nutrient name to its nutrient_values slot and category.
+    The vocabulary is small and stable, so results are memoized and each nutrient
+    in process_food_data costs a single dict lookup once its name has been seen.
+
+    Args:
+        nutrient_name (str): Nutrient name from the USDA payload
+
+    Returns:
+        tuple: (slot, category) as returned by get_nutrient_slot and get_nutrient_category
+    """
+    return get_nutrient_slot(nutrient_name), get_nutrient_category(nutrient_name)
+
+
+def cacheable_json_response(payload):
+    """
+    Wrap a serialized JSON body in a response the client may cache privately.
+    ConditionalGetMiddleware adds the ETag, so repeat requests get a bodiless 304.
+
+    Args:
+        payload (bytes): JSON body
+
+    Returns:
+        HttpResponse: application/json response with Cache-Control set
+    """
+    response = HttpResponse(payload, content_type='application/json')
+    patch_cache_control(response, private=True, max_age=CLIENT_CACHE_MAX_AGE)
+    return response
+
+
+# Gradio client for the Food_Scanner Space, created lazily once per worker
+food_scanner_client = None
+food_scanner_client_lock = threading.Lock()
+
+
+def get_food_scanner_client():
+    """
+    Return the shared Food_Scanner client, creating it on first use.
+    Building a Client connects to the Space and downloads its API schema,
+    so it's done once per worker instead of on every image request.
+    """
+    global food_scanner_client
+    if food_scanner_client is None:
+        with food_scanner_client_lock:
+            if food_scanner_client is None:
+                food_scanner_client = Client("Jeffawe/Food_Scanner")
+    return food_scanner_client
+
 
 def home(request):
     return render(request, 'home.html')
@@ -51,36 +295,78 @@ class RateLimiter:
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
+    # Two token buckets per client, both refilled continuously and passed as (capacity, tokens per millisecond):
+    # ARGV[1], ARGV[2] for all requests and ARGV[3], ARGV[4] for the Gemini allowance within them.
+    # An allowed request takes a request token, plus a Gemini token if one is left.
+    # Returns {allowed, use_bert, request tokens left}; idle buckets expire once both are full.
+    BUCKET_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local llm_capacity = tonumber(ARGV[3])
+    local llm_rate = tonumber(ARGV[4])
+    local now = tonumber(ARGV[5])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'llm_tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local llm_tokens = tonumber(bucket[2]) or llm_capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[3]) or now))
+    tokens = math.min(capacity, tokens + elapsed * rate)
+    llm_tokens = math.min(llm_capacity, llm_tokens + elapsed * llm_rate)
+    local allowed = 0
+    local use_bert = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+        if llm_tokens >= 1 then
+            llm_tokens = llm_tokens - 1
+        else
+            use_bert = 1
+        end
+    end
+    redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'llm_tokens', tostring(llm_tokens), 'updated', now)
+    local ttl = math.ceil((capacity - tokens) / rate)
+    if llm_rate > 0 then
+        ttl = math.max(ttl, math.ceil((llm_capacity - llm_tokens) / llm_rate))
+    end
+    redis.call('PEXPIRE', KEYS[1], math.max(1, ttl))
+    return {allowed, use_bert, tostring(tokens)}
+    """
+    take_token = redis_client.register_script(BUCKET_SCRIPT)
+
     @staticmethod
     def should_use_bert(request):
         """
-        Determine if BERT model should be used based on request count
+        Determine if BERT model should be used based on the client's hourly allowances.
+        Each client gets a bucket of Max_Requests tokens and a bucket of Max_LLM_Requests
+        Gemini tokens, each refilling continuously over an hour, so there is no window reset
+        to burst across. Requests switch to BERT while the Gemini bucket is empty and are
+        blocked while the request bucket is empty.
 
         Returns:
-            tuple: (use_bert, can_continue)
+            tuple: (use_bert, can_continue, retry_after)
                 - use_bert: Whether to switch to BERT model
                 - can_continue: Whether to allow the request
+                - retry_after: Seconds until a blocked client can try again
         """
         # Get client IP
         ip = RateLimiter.get_client_ip(request)
 
         # Create unique key for this IP and endpoint
-        rate_limit_key = f"rate_limit:{ip}:food_image_analysis"
-
-        # Increment request count and get current count
-        request_count = redis_client.incr(rate_limit_key)
+        rate_limit_key = f"rate_limit_bucket:{ip}:food_image_analysis"
 
-        # Set expiration if this is the first request
-        if request_count == 1:
-            redis_client.expire(rate_limit_key, 3600)  # 1-hour window
+        # Refill both buckets and take tokens in one atomic round-trip
+        refill_rate = Max_Requests / 3600000  # Tokens per millisecond
+        allowed, use_bert, tokens = RateLimiter.take_token(
+            keys=[rate_limit_key],
+            args=[Max_Requests, refill_rate, Max_LLM_Requests, Max_LLM_Requests / 3600000, int(time.time() * 1000)]
+        )
 
         # Check thresholds
-        if request_count > Max_Requests:
-            # Too many requests - block
-            return False, False
+        if not allowed:
+            # Too many requests - block until the next token arrives
+            return False, False, math.ceil((1 - float(tokens)) / refill_rate / 1000)
 
-        # Switch to BERT after 10 requests
-        return request_count > Max_LLM_Requests, True
+        # Switch to BERT once the Gemini allowance is used up
+        return bool(use_bert), True, 0
 
 
 class GlobalAPIUsageMiddleware:
@@ -88,71 +374,194 @@ class GlobalAPIUsageMiddleware:
     Middleware to track and limit overall API usage across the application
     """
 
+    # Check the limit and count the request atomically; returns 1 if the limit was already reached, else 0.
+    # Any counter without a TTL, new or left over from before windows were used, gets the ARGV[2]-second window.
+    USAGE_SCRIPT = """
+    if redis.call('TTL', KEYS[1]) == -1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    local usage = tonumber(redis.call('GET', KEYS[1]) or '0')
+    if usage >= tonumber(ARGV[1]) then
+        return 1
+    end
+    if redis.call('INCR', KEYS[1]) == 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
         self.TOTAL_MONTHLY_API_LIMIT = int(os.getenv('MONTHLY_API_LIMIT', 5000000))  # Total monthly API calls
         self.API_USAGE_KEY = "global_api_usage:current_month"
-        if not redis_client.exists(self.API_USAGE_KEY):
-            redis_client.set(self.API_USAGE_KEY, 0, ex=2592000)
+        self.API_USAGE_WINDOW = 2592000  # 30 days
+        self.count_usage = redis_client.register_script(self.USAGE_SCRIPT)
 
     def __call__(self, request):
-        # Check global API usage before processing request
-        current_usage = int(redis_client.get(self.API_USAGE_KEY) or 0)
+        # Check global API usage and count this request in one round-trip
+        limit_reached = self.count_usage(
+            keys=[self.API_USAGE_KEY],
+            args=[self.TOTAL_MONTHLY_API_LIMIT, self.API_USAGE_WINDOW]
+        )
 
-        if current_usage >= self.TOTAL_MONTHLY_API_LIMIT:
-            # Set a custom attribute on the request
-            request.api_limit_exceeded = True
-        else:
-            # Increment global API usage
-            redis_client.incr(self.API_USAGE_KEY)
-            request.api_limit_exceeded = False
+        # Set a custom attribute on the request
+        request.api_limit_exceeded = bool(limit_reached)
 
         response = self.get_response(request)
         return response
 
 # Create your views here.
-class FoodProductView(APIView):
+class FoodProductView(View):
     def get(self, request):
         # Get Product Name from React request
-        product_id = request.query_params.get('fcID')
+        product_id = request.GET.get('fcID')
 
         if not product_id:
-            return Response({"error": "Missing 'fcID' parameter"}, status=400)
+            return JsonResponse({"error": "Missing 'fcID' parameter"}, status=400)
+
+        if not FDC_ID_PATTERN.fullmatch(product_id):
+            return JsonResponse({"error": "'fcID' must be a numeric id"}, status=400)
+
+        # Same form as the batch view, so both share cache entries
+        product_id = str(int(product_id))
+
+        try:
+            payload = self.fetch_food_data(product_id)
+        except requests.HTTPError as e:
+            # USDA rejecting the id is the client's error, not a gateway failure
+            if e.response is not None and e.response.status_code == 404:
+                return JsonResponse({"error": f"No food found for fcID {product_id}"}, status=404)
+            if e.response is not None and e.response.status_code == 400:
+                return JsonResponse({"error": f"USDA rejected fcID {product_id}"}, status=400)
+            return JsonResponse({"error": "Failed to fetch data from USDA API"}, status=502)
+        except (requests.RequestException, orjson.JSONDecodeError):
+            return JsonResponse({"error": "Failed to fetch data from USDA API"}, status=502)
+
+        return cacheable_json_response(payload)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def fetch_food_data(product_id):
+        """
+        Fetch a single food from the USDA API and process it.
+        USDA food details for an fdcId don't change, so processed results are kept
+        in an in-process LRU on top of the shared Redis cache. Results are returned
+        as serialized JSON so cache hits go straight into the response body.
+        On a miss only one worker calls USDA for a given product; concurrent callers
+        get the last known copy, or wait briefly for the refresh to land. A last known
+        copy returned that way is memoized like a fresh one for the life of the worker,
+        which is safe only because USDA details for an fdcId don't change.
+
+        Args:
+            product_id (str): USDA fdcId
 
+        Returns:
+            bytes: Processed food information (see process_food_data) as JSON
+
+        Raises:
+            requests.RequestException: If the USDA API call fails
+        """
         # Check if result is in Redis cache
         cache_key = f"food_product:{product_id}"
         cached_result = redis_client.get(cache_key)
 
         if cached_result:
             # Return cached result if available
-            return Response(json.loads(cached_result))
+            return cached_result
+
+        # Let one worker refresh this product while the rest reuse its work
+        stale_key = f"stale:{cache_key}"
+        # The lock holds a per-owner token, so a fetch that outlives the TTL can't release another worker's lock
+        fetch_lock = redis_client.lock(f"lock:{cache_key}", timeout=USDA_FETCH_LOCK_TTL, blocking=False)
+        has_lock = fetch_lock.acquire()
+
+        if not has_lock:
+            stale_result = redis_client.get(stale_key)
+            if stale_result:
+                return stale_result
+
+            # Nothing to fall back on, give the refresh a moment to finish
+            deadline = time.monotonic() + USDA_FETCH_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                cached_result = redis_client.get(cache_key)
+                if cached_result:
+                    return cached_result
 
-        # If not in cache, fetch from API
-        api_key = os.getenv('USDA_API_KEY')
+        try:
+            # If not in cache, fetch from API
+            usda_api_url = f'https://api.nal.usda.gov/fdc/v1/food/{product_id}'
+            params = {
+                'format': 'full'
+            }
+
+            response = usda_session.get(usda_api_url, params=params, timeout=USDA_TIMEOUT)
+            response.raise_for_status()
+            food_data = orjson.loads(response.content)
+
+            payload = orjson.dumps(FoodProductView.process_food_data(food_data=food_data))
+
+            # Cache the result in Redis, keeping a longer-lived copy to serve during later refreshes
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(cache_key, CACHE_TTL, payload)
+            pipe.setex(stale_key, CACHE_TTL * 4, payload)
+            pipe.execute()
+        finally:
+            if has_lock:
+                try:
+                    fetch_lock.release()
+                except redis.exceptions.LockError:
+                    # Expired mid-fetch, possibly re-acquired by another worker; leave it alone
+                    pass
 
-        headers = {
-            'accept': 'application/json',
-        }
+        return payload
 
-        usda_api_url = f'https://api.nal.usda.gov/fdc/v1/food/{product_id}'
-        params = {
-            'format': 'full',
-            'api_key': api_key
-        }
+    @staticmethod
+    def fetch_many_food_data(product_ids):
+        """
+        Fetch several foods at once, sharing the per-food Redis cache with fetch_food_data.
+        Cached foods come back from a single MGET and the rest from one call to USDA's
+        multi-food endpoint, so a batch costs at most two network round trips.
 
-        response = requests.get(usda_api_url, headers=headers, params=params)
-        food_data = response.json()
+        Args:
+            product_ids (list): USDA fdcIds, at most USDA_BATCH_LIMIT
 
-        processed_data = self.process_food_data(food_data=food_data)
+        Returns:
+            list: Processed food information per id as JSON bytes, in order, None for ids USDA doesn't know
 
-        # Cache the result in Redis
-        redis_client.setex(
-            cache_key,
-            CACHE_TTL,
-            json.dumps(processed_data)
-        )
+        Raises:
+            requests.RequestException: If the USDA API call fails
+        """
+        cache_keys = [f"food_product:{product_id}" for product_id in product_ids]
+        results = {}
+        missing_ids = []
+
+        for product_id, cached_result in zip(product_ids, redis_client.mget(cache_keys)):
+            if cached_result:
+                results[product_id] = cached_result
+            else:
+                missing_ids.append(product_id)
+
+        if missing_ids:
+            usda_api_url = 'https://api.nal.usda.gov/fdc/v1/foods'
+            params = {
+                'fdcIds': missing_ids,
+                'format': 'full'
+            }
+
+            response = usda_session.get(usda_api_url, params=params, timeout=USDA_TIMEOUT)
+            response.raise_for_status()
+
+            # Cache the new results in Redis in one round trip
+            pipeline = redis_client.pipeline(transaction=False)
+            for food_data in orjson.loads(response.content):
+                product_id = str(food_data.get('fdcId'))
+                payload = orjson.dumps(FoodProductView.process_food_data(food_data=food_data))
+                results[product_id] = payload
+                pipeline.setex(f"food_product:{product_id}", CACHE_TTL, payload)
+            pipeline.execute()
 
-        return Response(processed_data)
+        return [results.get(product_id) for product_id in product_ids]
 
     @staticmethod
     def process_food_data(food_data):
@@ -166,17 +575,6 @@ class FoodProductView(APIView):
         Returns:
             dict: Processed food information with basic info, nutrients, and analysis
         """
-        # Group nutrients by category
-        nutrient_categories = {
-            'macronutrients': ['Protein', 'Total lipid (fat)', 'Carbohydrate, by difference'],
-            'vitamins': ['Vitamin A', 'Vitamin C', 'Vitamin D', 'Vitamin E', 'Vitamin K',
-                         'Thiamin', 'Riboflavin', 'Niacin', 'Vitamin B-6', 'Folate', 'Vitamin B-12'],
-            'minerals': ['Calcium', 'Iron', 'Magnesium', 'Phosphorus', 'Potassium', 'Sodium', 'Zinc',
-                         'Copper', 'Selenium'],
-            'other': ['Fiber, total dietary', 'Total Sugars', 'Cholesterol',
-                      'Fatty acids, total saturated', 'Fatty acids, total trans']
-        }
-
         # Extract comprehensive basic info
         basic_info = {
             'name': food_data.get('description', 'Unknown Food'),
@@ -196,40 +594,20 @@ class FoodProductView(APIView):
         }
 
         # Initialize nutrients structure
-        nutrients = {category: [] for category in nutrient_categories}
+        nutrients = {category: [] for category in NUTRIENT_CATEGORIES}
 
         # Track specific nutrients for health metrics
-        nutrient_values = {
-            'calories': None,
-            'fat': None,
-            'sodium': None,
-            'fiber': None,
-            'protein': None,
-            'carbs': None,
-            'sugars': None,
-            'cholesterol': None,
-            'saturated_fat': None,
-            'trans_fat': None,
-        }
+        nutrient_values = dict.fromkeys(NUTRIENT_VALUE_KEYS)
 
         # Get label nutrients if available (new format)
-        if 'labelNutrients' in food_data and food_data['labelNutrients']:
-            label_nutrients = food_data['labelNutrients']
-            if 'calories' in label_nutrients and label_nutrients['calories'] is not None:
-                nutrient_values['calories'] = label_nutrients['calories'].get('value')
-                basic_info['calories'] = nutrient_values['calories']
-
-            if 'fat' in label_nutrients and label_nutrients['fat'] is not None:
-                nutrient_values['fat'] = label_nutrients['fat'].get('value')
-
-            if 'sodium' in label_nutrients and label_nutrients['sodium'] is not None:
-                nutrient_values['sodium'] = label_nutrients['sodium'].get('value')
-
-            if 'protein' in label_nutrients and label_nutrients['protein'] is not None:
-                nutrient_values['protein'] = label_nutrients['protein'].get('value')
+        label_nutrients = food_data.get('labelNutrients')
+        if label_nutrients:
+            for label_key, value_key in LABEL_NUTRIENT_KEYS:
+                label_nutrient = label_nutrients.get(label_key)
+                if label_nutrient is not None:
+                    nutrient_values[value_key] = label_nutrient.get('value')
 
-            if 'carbohydrates' in label_nutrients and label_nutrients['carbohydrates'] is not None:
-                nutrient_values['carbs'] = label_nutrients['carbohydrates'].get('value')
+            basic_info['calories'] = nutrient_values['calories']
 
         # Process food nutrients if available in original format
         if 'foodNutrients' in food_data and food_data['foodNutrients']:
@@ -254,219 +632,225 @@ class FoodProductView(APIView):
                 if not nutrient_name or amount is None:
                     continue
 
-                # Get calories
-                if nutrient_name == 'Energy':
-                    basic_info['calories'] = amount
-                    nutrient_values['calories'] = amount
+                slot, category = classify_nutrient(nutrient_name)
 
                 # Extract key nutrients for health metrics
-                if 'Total lipid (fat)' in nutrient_name:
-                    nutrient_values['fat'] = amount
-                elif 'Sodium' in nutrient_name:
-                    nutrient_values['sodium'] = amount
-                elif 'Fiber, total dietary' in nutrient_name:
-                    nutrient_values['fiber'] = amount
-                elif nutrient_name == 'Protein':
-                    nutrient_values['protein'] = amount
-                elif 'Carbohydrate' in nutrient_name:
-                    nutrient_values['carbs'] = amount
-                elif 'Total Sugars' in nutrient_name:
-                    nutrient_values['sugars'] = amount
-                elif 'Cholesterol' in nutrient_name:
-                    nutrient_values['cholesterol'] = amount
-                elif 'saturated' in nutrient_name.lower():
-                    nutrient_values['saturated_fat'] = amount
-                elif 'trans' in nutrient_name.lower():
-                    nutrient_values['trans_fat'] = amount
-
-                # Categorize nutrients
-                categorized = False
-                for category, nutrient_list in nutrient_categories.items():
-                    if any(n in nutrient_name for n in nutrient_list):
-                        nutrients[category].append({
-                            'name': nutrient_name,
-                            'amount': amount,
-                            'unit': unit,
-                            'daily_value_percent': daily_value
-                        })
-                        categorized = True
-                        break
-
-                # Add to "other" if not categorized and has a value
-                if not categorized and amount is not None:
-                    nutrients['other'].append({
-                        'name': nutrient_name,
-                        'amount': amount,
-                        'unit': unit,
-                        'daily_value_percent': daily_value
-                    })
+                if slot:
+                    nutrient_values[slot] = amount
+                    if slot == 'calories':
+                        basic_info['calories'] = amount
+
+                # Categorize nutrients, anything unrecognized goes to "other"
+                nutrients[category].append({
+                    'name': nutrient_name,
+                    'amount': amount,
+                    'unit': unit,
+                    'daily_value_percent': daily_value
+                })
 
         # Add analysis and insights
+        health_metrics = {}
+        for metric, key, compare, threshold in HEALTH_METRIC_RULES:
+            value = nutrient_values[key]
+            health_metrics[metric] = value is not None and compare(value, threshold)
+
         analysis = {
-            'health_metrics': {
-                'is_low_fat': nutrient_values['fat'] is not None and nutrient_values['fat'] <= 3,
-                'is_low_sodium': nutrient_values['sodium'] is not None and nutrient_values['sodium'] <= 140,
-                'is_high_fiber': nutrient_values['fiber'] is not None and nutrient_values['fiber'] >= 5,
-                'is_low_calorie': nutrient_values['calories'] is not None and nutrient_values['calories'] <= 40,
-                'is_high_protein': nutrient_values['protein'] is not None and nutrient_values['protein'] >= 5,
-            },
+            'health_metrics': health_metrics,
             'nutritional_profile': {},
             'key_highlights': [],
             'additives': [],
             'allergens': []
         }
 
-        # Check for common allergens in ingredients
-        common_allergens = [
-            "milk", "dairy", "egg", "peanut", "tree nut", "soy", "wheat",
-            "gluten", "fish", "shellfish", "sesame"
-        ]
-
-        # Check for common additives
-        common_additives = [
-            "aspartame", "sucralose", "saccharin", "high fructose", "msg",
-            "monosodium glutamate", "artificial", "preservative", "benzoate",
-            "nitrite", "nitrate", "bht", "bha", "red dye", "yellow dye", "blue dye"
-        ]
-
         # Process ingredients for additives and allergens if available
         if basic_info['ingredients']:
-            ingredients_lower = basic_info['ingredients'].lower()
+            matched = {match.lower() for match in INGREDIENT_PATTERN.findall(basic_info['ingredients'])}
 
-            # Check for allergens
-            found_allergens = []
-            for allergen in common_allergens:
-                if allergen in ingredients_lower:
-                    found_allergens.append(allergen)
+            # Check for allergens (reported in COMMON_ALLERGENS order)
+            found_allergens = [allergen for allergen in COMMON_ALLERGENS if allergen in matched]
 
             if found_allergens:
                 analysis['allergens'] = found_allergens
 
             # Check for additives
-            found_additives = []
-            for additive in common_additives:
-                if additive in ingredients_lower:
-                    found_additives.append(additive)
+            found_additives = [additive for additive in COMMON_ADDITIVES if additive in matched]
 
             if found_additives:
                 analysis['additives'] = found_additives
 
         # Add nutritional profile analysis
-        if nutrient_values['calories'] is not None:
-            analysis['nutritional_profile']['calories_per_serving'] = nutrient_values['calories']
+        calories = nutrient_values['calories']
+        if calories is not None:
+            profile = analysis['nutritional_profile']
+            profile['calories_per_serving'] = calories
 
-        if nutrient_values['fat'] is not None and nutrient_values['calories'] is not None and nutrient_values[
-            'calories'] > 0:
-            fat_cal_percent = (nutrient_values['fat'] * 9 / nutrient_values['calories']) * 100
-            analysis['nutritional_profile']['fat_calories_percent'] = round(fat_cal_percent, 1)
+            if calories > 0:
+                fat = nutrient_values['fat']
+                protein = nutrient_values['protein']
+                carbs = nutrient_values['carbs']
 
-        if nutrient_values['protein'] is not None and nutrient_values['calories'] is not None and nutrient_values[
-            'calories'] > 0:
-            protein_cal_percent = (nutrient_values['protein'] * 4 / nutrient_values['calories']) * 100
-            analysis['nutritional_profile']['protein_calories_percent'] = round(protein_cal_percent, 1)
+                if fat is not None:
+                    profile['fat_calories_percent'] = round((fat * 9 / calories) * 100, 1)
 
-        if nutrient_values['carbs'] is not None and nutrient_values['calories'] is not None and nutrient_values[
-            'calories'] > 0:
-            carbs_cal_percent = (nutrient_values['carbs'] * 4 / nutrient_values['calories']) * 100
-            analysis['nutritional_profile']['carbs_calories_percent'] = round(carbs_cal_percent, 1)
+                if protein is not None:
+                    profile['protein_calories_percent'] = round((protein * 4 / calories) * 100, 1)
 
-        # Generate key highlights
-        highlights = []
+                if carbs is not None:
+                    profile['carbs_calories_percent'] = round((carbs * 4 / calories) * 100, 1)
 
-        if nutrient_values['calories'] is not None and nutrient_values['calories'] == 0:
-            highlights.append("Zero calories")
+        analysis['key_highlights'] = list(FoodProductView.generate_highlights(nutrient_values, analysis))
 
-        if nutrient_values['sodium'] is not None and nutrient_values['sodium'] > 400:
-            highlights.append("High sodium content")
-        elif nutrient_values['sodium'] is not None and nutrient_values['sodium'] < 140:
-            highlights.append("Low sodium")
+        return {
+            'basic_info': basic_info,
+            'nutrients': nutrients,
+            'analysis': analysis
+        }
 
-        if nutrient_values['fiber'] is not None and nutrient_values['fiber'] >= 5:
-            highlights.append("Good source of fiber")
+    @staticmethod
+    def generate_highlights(nutrient_values, analysis):
+        """
+        Yield the key highlights for a processed food, in display order.
 
-        if nutrient_values['protein'] is not None and nutrient_values['protein'] >= 5:
-            highlights.append("Good source of protein")
+        Args:
+            nutrient_values (dict): Tracked nutrient amounts keyed by NUTRIENT_VALUE_KEYS
+            analysis (dict): Analysis with 'additives' and 'allergens' already filled in
 
-        if nutrient_values['fat'] is not None and nutrient_values['fat'] <= 3:
-            highlights.append("Low fat")
-        elif nutrient_values['fat'] is not None and nutrient_values['fat'] >= 15:
-            highlights.append("High fat content")
+        Yields:
+            str: Highlight text
+        """
+        for key, compare, threshold, highlight in HIGHLIGHT_RULES:
+            value = nutrient_values[key]
+            if value is not None and compare(value, threshold):
+                yield highlight
 
         if analysis['additives']:
-            highlights.append("Contains artificial additives")
+            yield "Contains artificial additives"
 
         if analysis['allergens']:
-            allergen_list = ", ".join(analysis['allergens'])
-            highlights.append(f"Contains allergens: {allergen_list}")
-
-        analysis['key_highlights'] = highlights
-
-        return {
-            'basic_info': basic_info,
-            'nutrients': nutrients,
-            'analysis': analysis
-        }
+            yield f"Contains allergens: {', '.join(analysis['allergens'])}"
 
 
-class FoodProductViewMany(APIView):
+class FoodProductViewMany(View):
     def get(self, request):
         # Get Product Name from React request
-        product_name = request.query_params.get('name')
-        page_number = int(request.query_params.get('page', 1))
+        product_name = request.GET.get('name')
+        page_number = int(request.GET.get('page', 1))
 
         if not product_name:
-            return Response({"error": "Missing 'name' parameter"}, status=400)
+            return JsonResponse({"error": "Missing 'name' parameter"}, status=400)
+
+        try:
+            payload = self.search_foods(product_name, page_number)
+        except (requests.RequestException, orjson.JSONDecodeError):
+            return JsonResponse({"error": "Failed to fetch data from USDA API"}, status=502)
+
+        return cacheable_json_response(payload)
+
+    @staticmethod
+    def search_foods(query, page_number=1):
+        """
+        Search USDA for foods matching a query, going through the Redis search cache.
+        USDA search ignores case and spacing, so the query is normalized first and
+        variants like 'Coca Cola' and 'coca  cola' share one cache entry.
+
+        Args:
+            query (str): Search text
+            page_number (int): 1-based results page
+
+        Returns:
+            bytes: JSON body with 'totalPages' and processed 'data'
+
+        Raises:
+            requests.RequestException: If the USDA request fails
+        """
+        query = " ".join(query.lower().split())
 
         # Check if result is in Redis cache
-        cache_key = f"food_search:{product_name}:page:{page_number}"
+        cache_key = f"food_search:{query}:page:{page_number}"
         cached_result = redis_client.get(cache_key)
 
         if cached_result:
-            # Return cached result if available
-            return Response(json.loads(cached_result))
-
-        api_key = os.getenv('USDA_API_KEY')
-
-        headers = {
-            'accept': 'application/json',
-        }
+            # Cached value is already the JSON body
+            return cached_result
 
         usda_api_url = 'https://api.nal.usda.gov/fdc/v1/foods/search'
         params = {
-            'query': product_name,
+            'query': query,
             'pageSize': 25,
             'pageNumber': page_number,
             'dataType': 'Foundation, Branded',
             'sortBy': 'publishedDate',
-            'sortOrder': 'asc',
-            'api_key': api_key
+            'sortOrder': 'asc'
         }
 
-        response = requests.get(usda_api_url, headers=headers, params=params)
-        food_data = response.json()
+        response = usda_session.get(usda_api_url, params=params, timeout=USDA_TIMEOUT)
+        response.raise_for_status()
+
+        food_data = orjson.loads(response.content)
         result = {
             "totalPages": food_data.get('totalPages', 0),
-            "data": []
+            "data": [FoodProductView.process_food_data(food_data=data) for data in food_data.get('foods', [])]
         }
 
-        for data in food_data['foods']:
-            processed_data = FoodProductView.process_food_data(food_data=data)
-            result["data"].append(processed_data)
+        # Serialize once and reuse the same bytes for the cache and the response
+        payload = orjson.dumps(result)
 
         # Cache the result in Redis
         redis_client.setex(
             cache_key,
             CACHE_TTL,
-            json.dumps(result)
+            payload
         )
 
-        return Response(result)
+        return payload
+
+
+class FoodProductViewBatch(View):
+    def get(self, request):
+        # Comma separated fdcIds, e.g. ?fcIDs=534358,373052
+        product_ids = [product_id.strip() for product_id in request.GET.get('fcIDs', '').split(',') if product_id.strip()]
+
+        if not product_ids:
+            return JsonResponse({"error": "Missing 'fcIDs' parameter"}, status=400)
+
+        if not all(FDC_ID_PATTERN.fullmatch(product_id) for product_id in product_ids):
+            return JsonResponse({"error": "'fcIDs' must be a comma separated list of numeric ids"}, status=400)
+
+        # Drop duplicates but keep the requested order
+        product_ids = list(dict.fromkeys(str(int(product_id)) for product_id in product_ids))
+
+        if len(product_ids) > USDA_BATCH_LIMIT:
+            return JsonResponse({"error": f"At most {USDA_BATCH_LIMIT} ids can be requested at once"}, status=400)
+
+        try:
+            foods = FoodProductView.fetch_many_food_data(product_ids)
+        except (requests.RequestException, orjson.JSONDecodeError):
+            return JsonResponse({"error": "Failed to fetch data from USDA API"}, status=502)
+
+        # Splice the per-food JSON into the body instead of parsing and re-serializing it
+        payload = b'{"data":[' + b','.join(food or b'null' for food in foods) + b']}'
+        return cacheable_json_response(payload)
 
 
 class GeminiImageAnalyzer:
+    # Add ARGV[1] to the usage counter unless that takes it past ARGV[3]; returns 1 if counted, else 0.
+    # Any counter without a TTL, new or left over from before windows were used, gets the ARGV[2]-second window.
+    USAGE_SCRIPT = """
+    local usage = redis.call('INCRBY', KEYS[1], ARGV[1])
+    if redis.call('TTL', KEYS[1]) == -1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    if usage > tonumber(ARGV[3]) then
+        redis.call('DECRBY', KEYS[1], ARGV[1])
+        return 0
+    end
+    return 1
+    """
+
     def __init__(self):
-        # Initialize Redis for tracking API usage
-        self.redis_client = redis.from_url(redis_url)
+        # Track API usage through the shared Redis pool
+        self.redis_client = redis_client
+        self.count_usage = self.redis_client.register_script(self.USAGE_SCRIPT)
 
         # Set up Gemini API key and configuration
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
@@ -489,19 +873,15 @@ class GeminiImageAnalyzer:
         current_usage_key = "gemini_api_usage:current_month"
 
         try:
-            # Get current month's usage
-            current_usage = int(self.redis_client.get(current_usage_key) or 0)
-            new_usage = current_usage + tokens_used
-
-            # Check if usage exceeds limit
-            if new_usage > self.MONTHLY_API_LIMIT * (1 - self.USAGE_WARN_THRESHOLD):
-                return False
-
-            # Update usage
-            self.redis_client.set(current_usage_key, new_usage)
-            return True
+            # Add this request's usage and check it against the limit in one atomic round-trip;
+            # a request that would exceed the limit isn't counted
+            within_limit = self.count_usage(
+                keys=[current_usage_key],
+                args=[tokens_used, 2592000, self.MONTHLY_API_LIMIT * (1 - self.USAGE_WARN_THRESHOLD)]
+            )
+            return bool(within_limit)
         except redis.exceptions.ConnectionError as e:
-            print(f"Redis connection error: {e}")
+            logger.warning("Redis connection error: %s", e)
             return False
 
     def analyze_image(self, image_path, use_ocr=False):
@@ -516,8 +896,12 @@ class GeminiImageAnalyzer:
             str: Detected product name or description
         """
         try:
-            # Upload the file
-            uploaded_file = self.client.files.upload(file=image_path)
+            # Send the image inline with the prompt instead of uploading it to the Files API first
+            with open(image_path, 'rb') as image_file:
+                image_part = types.Part.from_bytes(
+                    data=image_file.read(),
+                    mime_type=mimetypes.guess_type(image_path)[0] or 'image/jpeg'
+                )
 
             # Prepare prompt
             prompt = ("Identify the food or product in this image. "
@@ -533,7 +917,7 @@ class GeminiImageAnalyzer:
             result = self.client.models.generate_content(
                 model="gemini-2.0-flash",
                 contents=[
-                    uploaded_file,
+                    image_part,
                     "\n\n",
                     prompt
                 ]
@@ -546,25 +930,46 @@ class GeminiImageAnalyzer:
                 # Fallback to existing method if near usage limit
                 return None
 
-            print(result.text.strip())
-            return result.text.strip()
+            product_name = result.text.strip()
+            logger.debug("Gemini result: %s", product_name)
+            return product_name
 
         except Exception as e:
             # Log the error, fallback to existing method
-            print(f"Gemini API error: {e}")
+            logger.warning("Gemini API error: %s", e)
             return None
 
+
+# Gemini analyzer, created lazily once per worker
+gemini_analyzer = None
+gemini_analyzer_lock = threading.Lock()
+
+
+def get_gemini_analyzer():
+    """
+    Return the shared GeminiImageAnalyzer, creating it on first use.
+    DRF builds a new view per request, so keeping the analyzer here lets the
+    genai client and its HTTP connections outlive a single request.
+    """
+    global gemini_analyzer
+    if gemini_analyzer is None:
+        with gemini_analyzer_lock:
+            if gemini_analyzer is None:
+                gemini_analyzer = GeminiImageAnalyzer()
+    return gemini_analyzer
+
+
 class FoodImageAnalysisView(APIView):
     parser_classes = (MultiPartParser, FormParser)
     def __init__(self, *args, **kwargs):
         super().__init__(**kwargs)
-        self.gemini_analyzer = GeminiImageAnalyzer()
+        self.gemini_analyzer = get_gemini_analyzer()
 
     def post(self, request):
         if 'image' not in request.FILES:
             return Response({'error': 'No image provided'}, status=400)
 
-        use_bert, can_continue = RateLimiter.should_use_bert(request)
+        use_bert, can_continue, retry_after = RateLimiter.should_use_bert(request)
 
         if getattr(request, 'api_limit_exceeded', False):
             use_bert = True
@@ -572,34 +977,34 @@ class FoodImageAnalysisView(APIView):
         if not can_continue:
             return Response({
                 'error': 'Rate limit exceeded',
-                'message': 'Too many requests. Try again in 1 hour.',
-                'retry_after': 3600
-            }, status=429)
+                'message': f'Too many requests. Try again in {retry_after} seconds.',
+                'retry_after': retry_after
+            }, status=429, headers={'Retry-After': str(retry_after)})
 
         image_file = request.FILES['image']
         use_OCR = request.data.get("use_OCR", "false")
         use_OCR = str(use_OCR).lower() in ["true", "1"]
 
-        # Generate a cache key from the image content
-        image_data = image_file.read()
-        image_hash = hash(image_data)
-        cache_key = f"food_image:{image_hash}:ocr:{use_OCR}"
-
-        # Check cache
-        cached_result = redis_client.get(cache_key)
-        if cached_result:
-            return Response(json.loads(cached_result))
-
-        # Reset file pointer for further processing
-        image_file.seek(0)
-
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
+        # Save the uploaded file temporarily, hashing it in the same pass
+        # so the cache key never needs the whole upload in memory
+        image_hash = hashlib.blake2b(digest_size=16)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg", dir=UPLOAD_TMP_DIR) as temp_file:
             for chunk in image_file.chunks():
+                image_hash.update(chunk)
                 temp_file.write(chunk)
             temp_file_path = temp_file.name
 
+        cache_key = f"food_image:{image_hash.hexdigest()}:ocr:{use_OCR}"
+
         try:
+            # Check cache
+            cached_result = redis_client.get(cache_key)
+            if cached_result:
+                # Cached value is already the JSON body
+                return HttpResponse(cached_result, content_type='application/json')
+
+            self.downscale_image(temp_file_path)
+
             if not use_bert:
                 gemini_result = self.gemini_analyzer.analyze_image(
                     temp_file_path,
@@ -618,13 +1023,16 @@ class FoodImageAnalysisView(APIView):
             if not processed_results:
                 return Response({'error': 'No food name detected from image'}, status=400)
 
-            food_details_response = self.get_food_details(processed_results, not use_bert)
+            try:
+                food_details_response = self.get_food_details(processed_results, not use_bert)
+            except (requests.RequestException, orjson.JSONDecodeError):
+                return Response({'error': 'Failed to fetch data from USDA API'}, status=502)
 
             # Cache the result
             redis_client.setex(
                 cache_key,
                 CACHE_TTL * 2,  # Cache image results longer (48 hours)
-                json.dumps(food_details_response)
+                orjson.dumps(food_details_response)
             )
 
             return Response(food_details_response)
@@ -633,17 +1041,52 @@ class FoodImageAnalysisView(APIView):
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
 
+    @staticmethod
+    def downscale_image(image_path, max_side=None):
+        """
+        Shrink an uploaded photo in place so its longest side is at most max_side pixels.
+        For JPEGs, draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale, so large phone
+        photos are never decoded at full resolution. Files that are already small enough,
+        or that PIL can't read, are left as they are.
+
+        Args:
+            image_path (str): Path to the image file
+            max_side (int): Longest allowed side, defaults to IMAGE_MAX_SIDE
+        """
+        max_side = max_side or IMAGE_MAX_SIDE
+
+        try:
+            with Image.open(image_path) as image:
+                if max(image.size) <= max_side:
+                    return
+
+                # No-op for formats other than JPEG, thumbnail() does the work there
+                image.draft('RGB', (max_side, max_side))
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+                # Encode fully before touching the file, so a failed encode leaves the upload intact
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=90)
+
+            with open(image_path, 'wb') as image_file:
+                image_file.write(buffer.getvalue())
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Not something PIL can decode or convert, send the original upload as-is
+            logger.warning("Skipping downscale of %s: %s", image_path, e)
+            return
+
     def process_image(self, image, use_OCR):
         # Example image processing
-        client = Client("Jeffawe/Food_Scanner")
+        client = get_food_scanner_client()
         result = client.predict(
             image=handle_file(image),
             use_ocr=use_OCR,
             api_name="/recognize_image"
         )
-        print(result)
+        logger.debug("Food_Scanner result: %s", result)
         final_result = " ".join(self.extract_product_name(result))
-        print(final_result)
+        logger.debug("Extracted product name: %s", final_result)
         # Placeholder return
         return final_result
 
@@ -651,45 +1094,50 @@ class FoodImageAnalysisView(APIView):
         if not text:
             return []
 
+        # Short all-caps or Title Case labels (e.g. "COCA COLA") are already the name, skip spaCy
+        words = text.split()
+        if 0 < len(words) <= 3 and all(word.isalpha() and (word.isupper() or word.istitle()) for word in words):
+            return [" ".join(words)]
+
         doc = nlp(text)
 
-        # 1. Look for brand names (usually in ALL CAPS or Title Case)
+        # 1 and 2 share a single pass over the tokens
         brands = []
-        for token in doc:
+        of_products = []
+        # Index a plain list so neighbour lookups don't go back through the Doc
+        tokens = list(doc)
+        doc_len = len(tokens)
+        for i, token in enumerate(tokens):
+            # 1. Look for brand names (usually in ALL CAPS or Title Case)
             if token.text.isupper() or (token.text.istitle() and len(token.text) > 2):
                 # Check if part of a multi-token brand name
-                if token.i < len(doc) - 1 and doc[token.i + 1].text.istitle():
-                    brands.append(token.text + " " + doc[token.i + 1].text)
+                if i < doc_len - 1 and tokens[i + 1].text.istitle():
+                    brands.append(token.text + " " + tokens[i + 1].text)
                 else:
                     brands.append(token.text)
 
-        # 2. Extract named entities labeled as PRODUCT or ORG
-        product_ents = [ent.text for ent in doc.ents if ent.label_ in ["PRODUCT", "ORG"]]
-
-        # 3. Look for "X of Y" patterns where Y is the product
-        of_products = []
-        for token in doc:
+            # 2. Look for "X of Y" patterns where Y is the product
             if token.dep_ == "pobj" and token.head.text.lower() == "of":
                 # Get the entire phrase starting from this token
-                start_idx = token.i
+                start_idx = i
                 end_idx = start_idx + 1
 
                 # Extend to include adjectives and compound nouns
-                while end_idx < len(doc) and (doc[end_idx].dep_ in ["compound", "amod", "nummod"]
-                                              or doc[end_idx].pos_ == "NOUN"):
+                while end_idx < doc_len and (tokens[end_idx].dep_ in ["compound", "amod", "nummod"]
+                                             or tokens[end_idx].pos_ == "NOUN"):
                     end_idx += 1
 
                 product_phrase = doc[start_idx:end_idx].text
 
                 # If we have adjectives before the object
-                prev_idx = token.i - 1
-                while prev_idx >= 0 and doc[prev_idx].dep_ in ["amod", "compound"] and doc[prev_idx].head == token:
-                    product_phrase = doc[prev_idx].text + " " + product_phrase
+                prev_idx = i - 1
+                while prev_idx >= 0 and tokens[prev_idx].dep_ in ["amod", "compound"] and tokens[prev_idx].head == token:
+                    product_phrase = tokens[prev_idx].text + " " + product_phrase
                     prev_idx -= 1
 
                 of_products.append(product_phrase)
 
-        # 4. Extract noun chunks as fallback, prioritizing food items
+        # 3. Extract noun chunks as fallback, prioritizing food items
         container_words = ["bottle", "box", "can", "jar", "package", "container", "bag"]
         food_nouns = []
         other_nouns = []
@@ -720,60 +1168,18 @@ class FoodImageAnalysisView(APIView):
         return other_nouns
 
     def get_food_details(self, product_name, use_llm):
-        """Calls FoodProductViewMany to fetch food details."""
+        """Runs the FoodProductViewMany search for the recognized product name."""
         if not product_name:
             return {'error': 'No valid product name found'}
 
-        # We can reuse the cache from FoodProductViewMany if it exists
-        cache_key = f"food_search:{product_name}:page:{1}"
-        cached_result = redis_client.get(cache_key)
-
-        if cached_result:
-            result = json.loads(cached_result)
-            result["searchTerm"] = product_name  # Add search term to the cached result
-            return result
-
-        api_key = os.getenv('USDA_API_KEY')
-
-        headers = {
-            'accept': 'application/json',
-        }
-
-        usda_api_url = 'https://api.nal.usda.gov/fdc/v1/foods/search'
-        params = {
-            'query': product_name,
-            'pageSize': 25,
-            'pageNumber': 1,
-            'dataType': 'Foundation, Branded',
-            'sortBy': 'publishedDate',
-            'sortOrder': 'asc',
-            'api_key': api_key
-        }
-
-        response = requests.get(usda_api_url, headers=headers, params=params)
-        food_data = response.json()
-        result = {
-            "totalPages": food_data.get('totalPages', 0),
-            "searchTerm": product_name,
-            "data": [],
-            "use_llm": use_llm
-        }
-
-        for data in food_data.get('foods', []):
-            processed_data = FoodProductView.process_food_data(food_data=data)
-            result['data'].append(processed_data)
-
-        # Cache this result too
-        redis_client.setex(
-            cache_key,
-            CACHE_TTL,
-            json.dumps(result)
-        )
+        # Shares the search cache with FoodProductViewMany
+        result = orjson.loads(FoodProductViewMany.search_foods(product_name))
+        result["searchTerm"] = product_name
+        result["use_llm"] = use_llm
 
         return result
 
 
-# Add a health check endpoint for Redis
 class HealthCheckView(APIView):
     def get(self, request):
         status = {
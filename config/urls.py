@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from api.views import FoodProductView, FoodProductViewMany, FoodImageAnalysisView, home, HealthCheckView
+from api.views import FoodProductView, FoodProductViewMany, FoodProductViewBatch, FoodImageAnalysisView, home, HealthCheckView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,5 +24,6 @@ urlpatterns = [
     path('health/', HealthCheckView.as_view()),
     path('analyze-food/', FoodProductView.as_view()),
     path('analyze-many-food/', FoodProductViewMany.as_view()),
+    path('analyze-food-batch/', FoodProductViewBatch.as_view()),
     path('analyze-image/', FoodImageAnalysisView.as_view()),
 ]
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn is started from the project root.
+"""
+
+wsgi_app = 'config.wsgi:application'
+
+# Import the app (and the spaCy model loaded in api.views) once in the master,
+# so forked workers share the model's memory copy-on-write instead of each loading it.
+# Redis and HTTP connections are opened lazily on first use, so each worker gets its own.
+preload_app = True
+
+# Image requests chain Gemini, the Food_Scanner fallback and a USDA search. A USDA call alone
+# is bounded at about 34s: four 3.05s connect attempts, at most two 10s reads (the first try
+# plus one gateway-error retry, read timeouts are never retried) and about 1.2s of backoff
+timeout = 60